@@ -2,8 +2,17 @@ from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import pyodbc
 import re
+import socket
 import json
+import marshal
+import multiprocessing
 import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 app = Flask(__name__)
@@ -19,26 +28,291 @@ DEFAULT_DATABASE = 'SistemaConversionDB1'
 DEFAULT_USERNAME = 'sa'
 DEFAULT_PASSWORD = '1234'  # Cambia esto por tu password real
 
+# Configuración del renderizado paralelo de diagramas
+# Desactivado: con 20k tablas en 1 CPU el modo secuencial tarda ~75 ms y el paralelo ~170-270 ms
+RENDER_PARALLEL_THRESHOLD = None  # Número de tablas a partir del cual se renderiza en paralelo (None = nunca)
+RENDER_SHARD_SIZE = 500  # Tablas por fragmento enviado a cada proceso
+RENDER_MAX_WORKERS = None  # None = os.cpu_count()
+
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+# Configuración de tiempos de espera y control de admisión de la introspección
+CONNECT_TIMEOUT_SECONDS = 10  # Tiempo máximo para establecer la conexión
+QUERY_TIMEOUT_SECONDS = 30  # Tiempo máximo por consulta al catálogo (por defecto)
+MAX_QUERY_TIMEOUT_SECONDS = 120  # Límite superior para el valor enviado por el cliente
+MAX_INFLIGHT_INTROSPECTIONS = 4  # Introspecciones simultáneas por servidor
+MAX_QUEUED_INTROSPECTIONS = 8  # Peticiones en espera por servidor antes de rechazar
+ADMISSION_WAIT_SECONDS = 5  # Tiempo máximo de espera en la cola
+ADMISSION_RETRY_AFTER_SECONDS = 5  # Valor de la cabecera Retry-After en las respuestas 503
+CANCELLED_STATUS = 499  # Código HTTP de una introspección cancelada por el cliente
+MAX_ADMISSION_QUEUES = 64  # Servidores con cola propia; las colas inactivas se descartan al superar el límite
+MAX_REQUEST_ID_LENGTH = 128
+
+# Excepción lanzada cuando una introspección no llega a ejecutarse: cola llena,
+# request_id duplicado o cancelación mientras esperaba en la cola
+class IntrospectionRejected(Exception):
+    def __init__(self, message, status=503):
+        super().__init__(message)
+        self.status = status
+
+# Excepción lanzada cuando el cliente cancela una introspección
+class IntrospectionCancelled(Exception):
+    pass
+
+# Cola de admisión por servidor: limita las introspecciones en curso y rechaza
+# rápidamente cuando la cola está llena o la espera supera ADMISSION_WAIT_SECONDS
+class AdmissionQueue:
+    def __init__(self, max_in_flight, max_queued, wait_timeout):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.wait_timeout = wait_timeout
+        self._condition = threading.Condition()
+        self.users = 0  # Peticiones que usan la cola; protegido por _admission_lock
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.cancelled = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def acquire(self):
+        start = time.monotonic()
+        with self._condition:
+            if self.in_flight >= self.max_in_flight and self.queued >= self.max_queued:
+                self.rejected_full += 1
+                raise IntrospectionRejected('Servidor ocupado: la cola de introspección está llena')
+            
+            self.queued += 1
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: self.in_flight < self.max_in_flight, timeout=self.wait_timeout)
+            finally:
+                self.queued -= 1
+            
+            waited = time.monotonic() - start
+            if not admitted:
+                self.rejected_timeout += 1
+                raise IntrospectionRejected('Servidor ocupado: tiempo de espera en la cola agotado')
+            
+            self.in_flight += 1
+            self.admitted += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+    
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+    
+    def record_cancelled(self):
+        with self._condition:
+            self.cancelled += 1
+    
+    def metrics(self):
+        with self._condition:
+            return {
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'admitted': self.admitted,
+                'rejected_full': self.rejected_full,
+                'rejected_timeout': self.rejected_timeout,
+                'cancelled': self.cancelled,
+                'avg_wait_seconds': self.total_wait_seconds / self.admitted if self.admitted else 0.0,
+                'max_wait_seconds': self.max_wait_seconds
+            }
+
+_admission_queues = OrderedDict()
+_admission_lock = threading.Lock()
+
+# Introspecciones en curso por request_id, para poder cancelarlas si el cliente se desconecta
+_inflight_introspections = {}
+_inflight_lock = threading.Lock()
+
+# Función para obtener la clave de la cola de un servidor. Los alias de la máquina local
+# (., (local), localhost, 127.0.0.1, nombre del equipo), el prefijo tcp: y el puerto por
+# defecto se normalizan. Otros nombres del mismo servidor (alias DNS, otra IP) no se
+# detectan: en ese caso el límite se aplica por nombre de servidor, no por instancia real
+_LOCAL_HOST_ALIASES = {'.', '(local)', 'localhost', '127.0.0.1', '::1', socket.gethostname().lower()}
+
+def _admission_key(server):
+    key = server.strip().lower()
+    if key.startswith('tcp:'):
+        key = key[4:]
+    
+    address, _, port = key.partition(',')
+    host, _, instance = address.partition('\\')
+    host = host.strip()
+    if host in _LOCAL_HOST_ALIASES:
+        host = 'localhost'
+    
+    key = host
+    if instance.strip():
+        key += '\\' + instance.strip()
+    if port.strip() and port.strip() != '1433':
+        key += ',' + port.strip()
+    return key
+
+# Función para obtener la cola de un servidor. Al superar MAX_ADMISSION_QUEUES se descartan
+# las colas sin peticiones, empezando por la usada hace más tiempo
+def _checkout_admission_queue(server):
+    key = _admission_key(server)
+    with _admission_lock:
+        queue = _admission_queues.get(key)
+        if queue is None:
+            if len(_admission_queues) >= MAX_ADMISSION_QUEUES:
+                idle = [k for k, q in _admission_queues.items() if q.users == 0]
+                if not idle:
+                    raise IntrospectionRejected('Servidor ocupado: demasiados servidores con introspecciones activas')
+                del _admission_queues[idle[0]]
+            queue = AdmissionQueue(MAX_INFLIGHT_INTROSPECTIONS, MAX_QUEUED_INTROSPECTIONS, ADMISSION_WAIT_SECONDS)
+            _admission_queues[key] = queue
+        _admission_queues.move_to_end(key)
+        queue.users += 1
+        return queue
+
+def _return_admission_queue(queue):
+    with _admission_lock:
+        queue.users -= 1
+
+# Función para obtener el request_id enviado por el cliente; se ignora si no es una cadena válida
+def get_request_id(data):
+    request_id = data.get('request_id')
+    if isinstance(request_id, str) and 0 < len(request_id) <= MAX_REQUEST_ID_LENGTH:
+        return request_id
+    return None
+
+# Contexto que reserva un hueco en la cola del servidor. La introspección se registra antes
+# de esperar en la cola, para que /api/cancelIntrospection pueda cancelarla también mientras espera
+@contextmanager
+def introspection_slot(server, request_id=None):
+    if request_id:
+        with _inflight_lock:
+            if request_id in _inflight_introspections:
+                raise IntrospectionRejected('Ya hay una introspección en curso con ese request_id', 409)
+            _inflight_introspections[request_id] = {'cursors': [], 'cancelled': False}
+    
+    try:
+        queue = _checkout_admission_queue(server)
+        try:
+            queue.acquire()
+            try:
+                if request_id:
+                    with _inflight_lock:
+                        if _inflight_introspections[request_id]['cancelled']:
+                            raise IntrospectionCancelled()
+                yield
+            except IntrospectionCancelled:
+                queue.record_cancelled()
+                raise
+            finally:
+                queue.release()
+        finally:
+            _return_admission_queue(queue)
+    finally:
+        if request_id:
+            with _inflight_lock:
+                _inflight_introspections.pop(request_id, None)
+
+# Función para abrir un cursor registrado en la introspección en curso
+def open_cursor(conn, request_id=None):
+    cursor = conn.cursor()
+    if request_id:
+        with _inflight_lock:
+            entry = _inflight_introspections.get(request_id)
+            if entry is not None:
+                entry['cursors'].append(cursor)
+    return cursor
+
+# Función para ejecutar una consulta al catálogo. Comprueba la cancelación antes de cada
+# consulta, porque cursor.cancel() no hace nada si el cursor está inactivo entre consultas
+def fetch_introspection(cursor, request_id, sql):
+    if request_id:
+        with _inflight_lock:
+            entry = _inflight_introspections.get(request_id)
+            if entry is not None and entry['cancelled']:
+                raise IntrospectionCancelled()
+    
+    try:
+        cursor.execute(sql)
+        return cursor.fetchall()
+    except pyodbc.Error as e:
+        # HY008: la consulta en curso fue cancelada con cursor.cancel()
+        if 'HY008' in str(e):
+            raise IntrospectionCancelled() from e
+        raise
+
+# Función para cancelar las consultas en curso de una introspección
+def cancel_introspection(request_id):
+    with _inflight_lock:
+        entry = _inflight_introspections.get(request_id)
+        if entry is None:
+            return False
+        entry['cancelled'] = True
+        cursors = list(entry['cursors'])
+    
+    for cursor in cursors:
+        try:
+            cursor.cancel()
+        except Exception as e:
+            print(f"Error cancelando consulta {request_id}: {str(e)}")
+    return True
+
+# Función para obtener el tiempo de espera por consulta solicitado por el cliente
+def get_query_timeout(data):
+    try:
+        timeout = int(data.get('query_timeout', QUERY_TIMEOUT_SECONDS))
+    except (TypeError, ValueError, OverflowError):
+        timeout = QUERY_TIMEOUT_SECONDS
+    return max(1, min(timeout, MAX_QUERY_TIMEOUT_SECONDS))
+
+# Función para construir la respuesta de error de conexión
+def connection_error_response(error):
+    if 'HYT00' in error:
+        return jsonify({'success': False, 'message': 'Tiempo de espera agotado conectando al servidor'}), 504
+    return jsonify({'success': False, 'message': error})
+
+# Función para construir la respuesta de error de una consulta al catálogo
+def introspection_error_response(error):
+    if 'HYT00' in error:
+        return jsonify({'success': False, 'message': 'Tiempo de espera agotado consultando el catálogo'}), 504
+    return jsonify({'success': False, 'message': error})
+
+# Función para construir la respuesta de una introspección cancelada por el cliente
+def cancellation_response():
+    return jsonify({'success': False, 'cancelled': True, 'message': 'Consulta cancelada'}), CANCELLED_STATUS
+
+# Función para construir la respuesta de una introspección rechazada
+def rejection_response(e):
+    if e.status == 503:
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': str(ADMISSION_RETRY_AFTER_SECONDS)}
+    return jsonify({'success': False, 'message': str(e)}), e.status
+
 # Función para conectar a la base de datos
-def connect_to_db(server, database, username, password):
+def connect_to_db(server, database, username, password, query_timeout=None):
     try:
         conn_str = f'DRIVER={{SQL Server}};SERVER={server};DATABASE={database};UID={username};PWD={password}'
-        conn = pyodbc.connect(conn_str)
+        conn = pyodbc.connect(conn_str, timeout=CONNECT_TIMEOUT_SECONDS)
+        if query_timeout:
+            # Tiempo máximo de cada consulta ejecutada en esta conexión
+            conn.timeout = query_timeout
         return conn, None
     except Exception as e:
         return None, str(e)
 
 # Función para obtener información de la base de datos
-def get_database_info(conn):
+def get_database_info(conn, request_id=None):
     try:
-        cursor = conn.cursor()
+        cursor = open_cursor(conn, request_id)
         
         # Obtener tablas (entidades)
-        cursor.execute("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
-        tables = [row.TABLE_NAME for row in cursor.fetchall()]
+        rows = fetch_introspection(cursor, request_id, "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
+        tables = [row.TABLE_NAME for row in rows]
         
         # Obtener relaciones (claves foráneas)
-        cursor.execute("""
+        rows = fetch_introspection(cursor, request_id, """
             SELECT 
                 fk.name AS FK_Name,
                 tp.name AS ParentTable,
@@ -50,23 +324,25 @@ def get_database_info(conn):
             INNER JOIN 
                 sys.tables tr ON fk.referenced_object_id = tr.object_id
         """)
-        relationships = [f"{row.FK_Name}: {row.ParentTable} -> {row.RefTable}" for row in cursor.fetchall()]
+        relationships = [f"{row.FK_Name}: {row.ParentTable} -> {row.RefTable}" for row in rows]
         
         return {
             'entities': tables,
             'relationships': relationships
         }, None
         
+    except IntrospectionCancelled:
+        raise
     except Exception as e:
         return None, str(e)
 
 # Función para generar diagrama ER/EER
-def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=True, show_attributes=True):
+def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=True, show_attributes=True, request_id=None):
     try:
-        cursor = conn.cursor()
+        cursor = open_cursor(conn, request_id)
         
         # Obtener información de tablas y columnas
-        cursor.execute("""
+        rows = fetch_introspection(cursor, request_id, """
             SELECT 
                 t.name AS TableName,
                 c.name AS ColumnName,
@@ -94,7 +370,7 @@ def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=Tru
         """)
         
         tables = {}
-        for row in cursor.fetchall():
+        for row in rows:
             table_name = row.TableName
             if table_name not in tables:
                 tables[table_name] = []
@@ -108,7 +384,7 @@ def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=Tru
             })
         
         # Obtener información de relaciones
-        cursor.execute("""
+        rows = fetch_introspection(cursor, request_id, """
             SELECT 
                 fk.name AS FK_Name,
                 tp.name AS ParentTable,
@@ -130,7 +406,7 @@ def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=Tru
         """)
         
         relationships = []
-        for row in cursor.fetchall():
+        for row in rows:
             relationships.append({
                 'name': row.FK_Name,
                 'parent_table': row.ParentTable,
@@ -147,31 +423,140 @@ def generate_eer_diagram(conn, visualization_type='text', show_cardinalities=Tru
         
         return diagram, None
         
+    except IntrospectionCancelled:
+        raise
     except Exception as e:
         return None, str(e)
 
+# Funciones de renderizado por tabla. Agregan las líneas de la tabla a `lines`
+# directamente desde las filas del catálogo (diccionarios por columna)
+def _render_mermaid_entity(lines, table_name, columns, show_attributes=True):
+    lines.append(f"    {table_name} {{")
+    
+    # Agregar atributos
+    if show_attributes:
+        pk_columns = [col for col in columns if col['is_primary_key']]
+        other_columns = [col for col in columns if not col['is_primary_key']]
+        
+        for col in pk_columns:
+            lines.append(f"        {col['type']} {col['name']} PK")
+        
+        for col in other_columns:
+            fk_indicator = " FK" if col['is_foreign_key'] else ""
+            nullable_indicator = " NULL" if col['nullable'] else ""
+            lines.append(f"        {col['type']} {col['name']}{fk_indicator}{nullable_indicator}")
+    
+    lines.append("    }")
+
+def _render_text_entity(lines, table_name, columns, show_attributes=True):
+    lines.append(f"ENTIDAD: {table_name}")
+    lines.append("-" * 30)
+    
+    # Agregar atributos
+    if show_attributes:
+        pk_columns = [col for col in columns if col['is_primary_key']]
+        other_columns = [col for col in columns if not col['is_primary_key']]
+        
+        if pk_columns:
+            lines.append("  ATRIBUTOS CLAVE PRIMARIA:")
+            for col in pk_columns:
+                lines.append(f"    * {col['name']} ({col['type']})")
+        
+        if other_columns:
+            lines.append("  OTROS ATRIBUTOS:")
+            for col in other_columns:
+                fk_indicator = " [FK]" if col['is_foreign_key'] else ""
+                nullable_indicator = " [NULL]" if col['nullable'] else ""
+                lines.append(f"    * {col['name']} ({col['type']}){fk_indicator}{nullable_indicator}")
+    
+    lines.append("")
+
+def _render_relational_table(lines, table_name, columns):
+    lines.append(f"{table_name} (")
+    
+    # Agregar columnas (atributos)
+    pk_columns = [col for col in columns if col['is_primary_key']]
+    other_columns = [col for col in columns if not col['is_primary_key']]
+    
+    all_columns = pk_columns + other_columns
+    for i, col in enumerate(all_columns):
+        pk_indicator = " PK" if col['is_primary_key'] else ""
+        fk_indicator = " FK" if col['is_foreign_key'] else ""
+        nullable_indicator = " NULL" if col['nullable'] else " NOT NULL"
+        
+        line_end = "," if i < len(all_columns) - 1 else ""
+        lines.append(f"    {col['name']} {col['type']}{pk_indicator}{fk_indicator}{nullable_indicator}{line_end}")
+    
+    lines.append(")")
+    lines.append("")
+
+_TABLE_RENDERERS = {
+    'mermaid': _render_mermaid_entity,
+    'text': _render_text_entity,
+    'relational': _render_relational_table,
+}
+
+def _render_items(kind, items, options):
+    renderer = _TABLE_RENDERERS[kind]
+    lines = []
+    for table_name, columns in items:
+        renderer(lines, table_name, columns, *options)
+    return lines
+
+# Función ejecutada en cada proceso: recibe el fragmento serializado con marshal
+# y devuelve su texto ya unido, para que el retorno por IPC sea una sola cadena
+def _render_shard(task):
+    kind, payload, options = task
+    return "\n".join(_render_items(kind, marshal.loads(payload), options))
+
+def _get_render_executor():
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is None:
+            # 'spawn' evita heredar por fork los locks de los hilos del servidor
+            _render_executor = ProcessPoolExecutor(
+                max_workers=RENDER_MAX_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _render_executor
+
+def _discard_render_executor(executor):
+    global _render_executor
+    with _render_executor_lock:
+        if _render_executor is executor:
+            _render_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _parallel_render_enabled(table_count):
+    return RENDER_PARALLEL_THRESHOLD is not None and table_count >= RENDER_PARALLEL_THRESHOLD
+
+# Función para renderizar las tablas del catálogo. Devuelve fragmentos de texto que se
+# unen con "\n". Si se define RENDER_PARALLEL_THRESHOLD y se supera,
+# divide las tablas en fragmentos y los renderiza en un pool de procesos; los fragmentos
+# se reensamblan en su orden original, por lo que el resultado es idéntico al secuencial
+def render_tables(tables, kind, *options):
+    if not _parallel_render_enabled(len(tables)):
+        return _render_items(kind, tables.items(), options)
+    
+    items = list(tables.items())
+    tasks = [
+        (kind, marshal.dumps(items[i:i + RENDER_SHARD_SIZE]), options)
+        for i in range(0, len(items), RENDER_SHARD_SIZE)
+    ]
+    
+    executor = _get_render_executor()
+    try:
+        return list(executor.map(_render_shard, tasks))
+    except (OSError, RuntimeError, BrokenProcessPool) as e:
+        # Si el pool no está disponible, se descarta y se renderiza en el proceso actual
+        print(f"Renderizado paralelo no disponible, usando modo secuencial: {str(e)}")
+        _discard_render_executor(executor)
+        return _render_items(kind, items, options)
+
 # Función para generar diagrama en formato Mermaid
 def generate_mermaid_diagram(tables, relationships, show_cardinalities=True, show_attributes=True):
     diagram_lines = ["erDiagram"]
     
     # Agregar entidades
-    for table_name, columns in tables.items():
-        diagram_lines.append(f"    {table_name} {{")
-        
-        # Agregar atributos
-        if show_attributes:
-            pk_columns = [col for col in columns if col['is_primary_key']]
-            other_columns = [col for col in columns if not col['is_primary_key']]
-            
-            for col in pk_columns:
-                diagram_lines.append(f"        {col['type']} {col['name']} PK")
-            
-            for col in other_columns:
-                fk_indicator = " FK" if col['is_foreign_key'] else ""
-                nullable_indicator = " NULL" if col['nullable'] else ""
-                diagram_lines.append(f"        {col['type']} {col['name']}{fk_indicator}{nullable_indicator}")
-        
-        diagram_lines.append("    }")
+    diagram_lines.extend(render_tables(tables, 'mermaid', show_attributes))
     
     # Agregar relaciones con cardinalidades mejoradas
     if show_cardinalities:
@@ -188,28 +573,7 @@ def generate_text_diagram(tables, relationships, show_cardinalities=True, show_a
     diagram_lines = ["DIAGRAMA ENTIDAD-RELACIÓN (ER/EER)", "=" * 50, ""]
     
     # Agregar entidades
-    for table_name, columns in tables.items():
-        diagram_lines.append(f"ENTIDAD: {table_name}")
-        diagram_lines.append("-" * 30)
-        
-        # Agregar atributos
-        if show_attributes:
-            pk_columns = [col for col in columns if col['is_primary_key']]
-            other_columns = [col for col in columns if not col['is_primary_key']]
-            
-            if pk_columns:
-                diagram_lines.append("  ATRIBUTOS CLAVE PRIMARIA:")
-                for col in pk_columns:
-                    diagram_lines.append(f"    * {col['name']} ({col['type']})")
-            
-            if other_columns:
-                diagram_lines.append("  OTROS ATRIBUTOS:")
-                for col in other_columns:
-                    fk_indicator = " [FK]" if col['is_foreign_key'] else ""
-                    nullable_indicator = " [NULL]" if col['nullable'] else ""
-                    diagram_lines.append(f"    * {col['name']} ({col['type']}){fk_indicator}{nullable_indicator}")
-        
-        diagram_lines.append("")
+    diagram_lines.extend(render_tables(tables, 'text', show_attributes))
     
     # Agregar relaciones
     if show_cardinalities and relationships:
@@ -224,12 +588,12 @@ def generate_text_diagram(tables, relationships, show_cardinalities=True, show_a
     return "\n".join(diagram_lines)
 
 # Función para generar modelo relacional
-def generate_relational_model(conn):
+def generate_relational_model(conn, request_id=None):
     try:
-        cursor = conn.cursor()
+        cursor = open_cursor(conn, request_id)
         
         # Obtener información de tablas y columnas
-        cursor.execute("""
+        rows = fetch_introspection(cursor, request_id, """
             SELECT 
                 t.name AS TableName,
                 c.name AS ColumnName,
@@ -260,7 +624,7 @@ def generate_relational_model(conn):
         """)
         
         tables = {}
-        for row in cursor.fetchall():
+        for row in rows:
             table_name = row.TableName
             if table_name not in tables:
                 tables[table_name] = []
@@ -284,7 +648,7 @@ def generate_relational_model(conn):
             })
         
         # Obtener información de relaciones
-        cursor.execute("""
+        rows = fetch_introspection(cursor, request_id, """
             SELECT 
                 fk.name AS FK_Name,
                 tp.name AS ParentTable,
@@ -306,7 +670,7 @@ def generate_relational_model(conn):
         """)
         
         relationships = []
-        for row in cursor.fetchall():
+        for row in rows:
             relationships.append({
                 'name': row.FK_Name,
                 'parent_table': row.ParentTable,
@@ -319,24 +683,7 @@ def generate_relational_model(conn):
         diagram_lines = ["MODELO RELACIONAL", "=" * 50, ""]
         
         # Agregar tablas (relaciones)
-        for table_name, columns in tables.items():
-            diagram_lines.append(f"{table_name} (")
-            
-            # Agregar columnas (atributos)
-            pk_columns = [col for col in columns if col['is_primary_key']]
-            other_columns = [col for col in columns if not col['is_primary_key']]
-            
-            all_columns = pk_columns + other_columns
-            for i, col in enumerate(all_columns):
-                pk_indicator = " PK" if col['is_primary_key'] else ""
-                fk_indicator = " FK" if col['is_foreign_key'] else ""
-                nullable_indicator = " NULL" if col['nullable'] else " NOT NULL"
-                
-                line_end = "," if i < len(all_columns) - 1 else ""
-                diagram_lines.append(f"    {col['name']} {col['type']}{pk_indicator}{fk_indicator}{nullable_indicator}{line_end}")
-            
-            diagram_lines.append(")")
-            diagram_lines.append("")
+        diagram_lines.extend(render_tables(tables, 'relational'))
         
         # Agregar claves foráneas
         if relationships:
@@ -350,6 +697,8 @@ def generate_relational_model(conn):
         
         return "\n".join(diagram_lines), None
         
+    except IntrospectionCancelled:
+        raise
     except Exception as e:
         return None, str(e)
 
@@ -536,20 +885,31 @@ def api_get_entities_and_relationships():
         username = data.get('username', DEFAULT_USERNAME)
         password = data.get('password', DEFAULT_PASSWORD)
         
-        print(f"Obteniendo info de: {server}, BD: {database}")
+        request_id = get_request_id(data)
         
-        conn, error = connect_to_db(server, database, username, password)
-        if error:
-            return jsonify({'success': False, 'message': error})
+        print(f"Obteniendo info de: {server}, BD: {database}")
         
-        info, error = get_database_info(conn)
-        conn.close()
+        with introspection_slot(server, request_id):
+            conn, error = connect_to_db(server, database, username, password, get_query_timeout(data))
+            if error:
+                return connection_error_response(error)
+            
+            try:
+                info, error = get_database_info(conn, request_id)
+            finally:
+                conn.close()
         
         if error:
-            return jsonify({'success': False, 'message': error})
+            return introspection_error_response(error)
         
         return jsonify({'success': True, 'entities': info['entities'], 'relationships': info['relationships']})
         
+    except IntrospectionCancelled:
+        print(f"Introspección cancelada para {server}: {request_id}")
+        return cancellation_response()
+    except IntrospectionRejected as e:
+        print(f"Introspección rechazada para {server}: {str(e)}")
+        return rejection_response(e)
     except Exception as e:
         print(f"Error en getEntitiesAndRelationships: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
@@ -566,20 +926,31 @@ def api_generate_eer_diagram():
         show_cardinalities = data.get('show_cardinalities', True)
         show_attributes = data.get('show_attributes', True)
         
-        print(f"Generando diagrama EER para: {database}")
+        request_id = get_request_id(data)
         
-        conn, error = connect_to_db(server, database, username, password)
-        if error:
-            return jsonify({'success': False, 'message': error})
+        print(f"Generando diagrama EER para: {database}")
         
-        diagram, error = generate_eer_diagram(conn, visualization_type, show_cardinalities, show_attributes)
-        conn.close()
+        with introspection_slot(server, request_id):
+            conn, error = connect_to_db(server, database, username, password, get_query_timeout(data))
+            if error:
+                return connection_error_response(error)
+            
+            try:
+                diagram, error = generate_eer_diagram(conn, visualization_type, show_cardinalities, show_attributes, request_id)
+            finally:
+                conn.close()
         
         if error:
-            return jsonify({'success': False, 'message': error})
+            return introspection_error_response(error)
         
         return jsonify({'success': True, 'diagram': diagram})
         
+    except IntrospectionCancelled:
+        print(f"Introspección cancelada para {server}: {request_id}")
+        return cancellation_response()
+    except IntrospectionRejected as e:
+        print(f"Introspección rechazada para {server}: {str(e)}")
+        return rejection_response(e)
     except Exception as e:
         print(f"Error en generateEERDiagram: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
@@ -593,24 +964,63 @@ def api_generate_relational_model():
         username = data.get('username', DEFAULT_USERNAME)
         password = data.get('password', DEFAULT_PASSWORD)
         
-        print(f"Generando modelo relacional para: {database}")
+        request_id = get_request_id(data)
         
-        conn, error = connect_to_db(server, database, username, password)
-        if error:
-            return jsonify({'success': False, 'message': error})
+        print(f"Generando modelo relacional para: {database}")
         
-        diagram, error = generate_relational_model(conn)
-        conn.close()
+        with introspection_slot(server, request_id):
+            conn, error = connect_to_db(server, database, username, password, get_query_timeout(data))
+            if error:
+                return connection_error_response(error)
+            
+            try:
+                diagram, error = generate_relational_model(conn, request_id)
+            finally:
+                conn.close()
         
         if error:
-            return jsonify({'success': False, 'message': error})
+            return introspection_error_response(error)
         
         return jsonify({'success': True, 'model': diagram})
         
+    except IntrospectionCancelled:
+        print(f"Introspección cancelada para {server}: {request_id}")
+        return cancellation_response()
+    except IntrospectionRejected as e:
+        print(f"Introspección rechazada para {server}: {str(e)}")
+        return rejection_response(e)
     except Exception as e:
         print(f"Error en generateRelationalModel: {str(e)}")
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/api/cancelIntrospection', methods=['POST'])
+def api_cancel_introspection():
+    try:
+        # Se acepta text/plain porque el navegador lo envía con navigator.sendBeacon al cerrar la página
+        data = request.get_json(force=True, silent=True) or {}
+        request_id = get_request_id(data)
+        
+        cancelled = cancel_introspection(request_id) if request_id else False
+        if cancelled:
+            print(f"Introspección cancelada: {request_id}")
+        
+        return jsonify({'success': True, 'cancelled': cancelled})
+        
+    except Exception as e:
+        print(f"Error en cancelIntrospection: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)})
+
+@app.route('/api/introspectionMetrics', methods=['GET'])
+def api_introspection_metrics():
+    with _admission_lock:
+        queues = list(_admission_queues.values())
+    
+    # No se incluyen los nombres de los servidores: la API es accesible desde cualquier origen
+    return jsonify({
+        'success': True,
+        'queues': [queue.metrics() for queue in queues]
+    })
+
 @app.route('/api/translateSqlToAlgebra', methods=['POST'])
 def api_sql_to_ar():
     try:
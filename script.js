@@ -22,6 +22,63 @@ document.addEventListener('DOMContentLoaded', function() {
         mermaidInitialized: false
     };
 
+    // Introspección en curso por tipo (entidades, eer, relacional). Se cancela en el servidor
+    // al iniciar otra del mismo tipo o al cerrar la página
+    const pendingIntrospections = new Map();
+
+    function newIntrospectionId() {
+        return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    function cancelIntrospection(requestId) {
+        fetch('http://localhost:5000/api/cancelIntrospection', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ request_id: requestId }),
+            keepalive: true
+        }).catch(error => console.error('Error cancelando introspección:', error));
+    }
+
+    // Función para iniciar una introspección, cancelando la anterior del mismo tipo
+    function startIntrospection(kind) {
+        if (pendingIntrospections.has(kind)) {
+            cancelIntrospection(pendingIntrospections.get(kind));
+        }
+        const requestId = newIntrospectionId();
+        pendingIntrospections.set(kind, requestId);
+        return requestId;
+    }
+
+    function finishIntrospection(kind, requestId) {
+        if (pendingIntrospections.get(kind) === requestId) {
+            pendingIntrospections.delete(kind);
+        }
+    }
+
+    function cancelPendingIntrospections() {
+        pendingIntrospections.forEach(requestId => {
+            // text/plain para que sendBeacon no requiera preflight CORS
+            const payload = new Blob([JSON.stringify({ request_id: requestId })], { type: 'text/plain' });
+            navigator.sendBeacon('http://localhost:5000/api/cancelIntrospection', payload);
+        });
+        pendingIntrospections.clear();
+    }
+
+    window.addEventListener('pagehide', cancelPendingIntrospections);
+
+    // Función para leer la respuesta de una introspección (409, 499, 503 y 504 incluyen el mensaje del servidor)
+    function parseIntrospectionResponse(response) {
+        if ([409, 499, 503, 504].includes(response.status)) {
+            return response.json();
+        }
+        if (!response.ok) {
+            throw new Error(`Error HTTP: ${response.status}`);
+        }
+        return response.json();
+    }
+
     // Cargar configuración guardada
     function loadSavedConfig() {
         const savedConfig = localStorage.getItem('dbConnectionConfig');
@@ -465,20 +522,24 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Función para actualizar las listas de entidades y relaciones
     function updateEntityAndRelationshipLists() {
+        const requestId = startIntrospection('entities');
+        
         fetch('http://localhost:5000/api/getEntitiesAndRelationships', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(appState.connectionParams)
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Error HTTP: ${response.status}`);
-            }
-            return response.json();
+            body: JSON.stringify({
+                ...appState.connectionParams,
+                request_id: requestId
+            })
         })
+        .then(parseIntrospectionResponse)
         .then(data => {
+            if (data.cancelled) {
+                return;
+            }
+            
             if (data.success) {
                 const entitiesList = document.getElementById('entities-list');
                 const relationshipsList = document.getElementById('relationships-list');
@@ -514,6 +575,9 @@ document.addEventListener('DOMContentLoaded', function() {
         .catch(error => {
             console.error('Error:', error);
             showAlert('Error obteniendo información de la base de datos: ' + error.message, 'danger');
+        })
+        .finally(() => {
+            finishIntrospection('entities', requestId);
         });
     }
 
@@ -542,6 +606,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }, 100);
         
+        const requestId = startIntrospection('eer');
+        
         fetch('http://localhost:5000/api/generateEERDiagram', {
             method: 'POST',
             headers: {
@@ -551,17 +617,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 ...appState.connectionParams,
                 visualization_type: visualizationType,
                 show_cardinalities: showCardinalities,
-                show_attributes: showAttributes
+                show_attributes: showAttributes,
+                request_id: requestId
             })
         })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Error HTTP: ${response.status}`);
-            }
-            return response.json();
-        })
+        .then(parseIntrospectionResponse)
         .then(data => {
             clearInterval(progressInterval);
+            if (data.cancelled) {
+                return;
+            }
+            
             progressBar.style.width = '100%';
             
             setTimeout(() => {
@@ -604,6 +670,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 </div>
             `;
             showAlert('Error generando diagrama: ' + error.message, 'danger');
+        })
+        .finally(() => {
+            finishIntrospection('eer', requestId);
         });
     });
 
@@ -680,21 +749,25 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }, 100);
         
+        const requestId = startIntrospection('relational');
+        
         fetch('http://localhost:5000/api/generateRelationalModel', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(appState.connectionParams)
-        })
-        .then(response => {
-            if (!response.ok) {
-                throw new Error(`Error HTTP: ${response.status}`);
-            }
-            return response.json();
+            body: JSON.stringify({
+                ...appState.connectionParams,
+                request_id: requestId
+            })
         })
+        .then(parseIntrospectionResponse)
         .then(data => {
             clearInterval(progressInterval);
+            if (data.cancelled) {
+                return;
+            }
+            
             progressBar.style.width = '100%';
             
             setTimeout(() => {
@@ -732,6 +805,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 </div>
             `;
             showAlert('Error generando modelo relacional: ' + error.message, 'danger');
+        })
+        .finally(() => {
+            finishIntrospection('relational', requestId);
         });
     });
 